@@ -2,23 +2,43 @@
 FastAPI test application for TokenVault authentication.
 Run with: uvicorn examples.fastapi_example:app --reload
 Then visit: http://localhost:8001/docs
+
+Optional environment variables (used by examples/load_test.py):
+- TOKENVAULT_EXAMPLE_VAULT: load the vault from this file instead of starting empty, and persist /add to it
+- TOKENVAULT_EXAMPLE_VALIDATION: "sync" validates on the event loop (default), "async" in the threadpool
+- TOKENVAULT_EXAMPLE_CACHE: cache up to this many validation results (default 0, no cache)
 """
 
 import os
 import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from tokenvault import TokenVault
+from tokenvault import TokenVault, VaultPersister
 
 # Create a temporary vault for testing
-vault_file = os.path.join(tempfile.gettempdir(), "test_vault.db")
-vault = TokenVault()  # Start with empty vault
+vault_file = os.getenv("TOKENVAULT_EXAMPLE_VAULT", os.path.join(tempfile.gettempdir(), "test_vault.db"))
+# Start with empty vault unless one is given; then new users are saved back to it in the background
+vault = TokenVault(vault_file) if "TOKENVAULT_EXAMPLE_VAULT" in os.environ else TokenVault()
+persister = VaultPersister(vault, vault_file) if "TOKENVAULT_EXAMPLE_VAULT" in os.environ else None
+validation_mode = os.getenv("TOKENVAULT_EXAMPLE_VALIDATION", "sync")
+cache_size = int(os.getenv("TOKENVAULT_EXAMPLE_CACHE", "0"))
+validation_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if persister is not None:
+        await persister.close()
 
 app = FastAPI(
     title="TokenVault API",
     description="Simple authentication API using TokenVault tokens",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 security = HTTPBearer()
@@ -26,8 +46,8 @@ security = HTTPBearer()
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Authenticate user using TokenVault token"""
     token = credentials.credentials
-    user_data = vault.validate(token)
-    
+    user_data = await validate(token)
+
     if user_data is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,11 +57,29 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     return user_data
 
+async def validate(token: str):
+    """Validate with the configured mode, through a small LRU cache of successful validations"""
+    if cache_size and token in validation_cache:
+        validation_cache.move_to_end(token)
+        return dict(validation_cache[token])
+    if validation_mode == "async":
+        user_data = await run_in_threadpool(vault.validate, token)
+    else:
+        user_data = vault.validate(token)
+    if cache_size and user_data is not None:
+        validation_cache[token] = dict(user_data)
+        if len(validation_cache) > cache_size:
+            validation_cache.popitem(last=False)
+    return user_data
+
 @app.post("/add")
 async def add_user(email: str):
     """Add a new user and get their token"""
     try:
-        token = vault.add(email, {"email": email, "created_at": datetime.now().isoformat()})
+        metadata = {"email": email, "created_at": datetime.now().isoformat()}
+        # Key generation and saving happen off the event loop when persisting
+        token = await persister.add(email, metadata) if persister else vault.add(email, metadata)
+        validation_cache.clear()  # re-adding a user replaces their key
         
         # Create a copy-paste ready curl command with proper quoting
         curl_command = f"curl -H 'Authorization: Bearer {token}' http://localhost:8001/protected"
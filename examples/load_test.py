@@ -0,0 +1,196 @@
+"""
+Load test for the FastAPI example (examples/fastapi_example.py).
+
+Generates a vault, starts the example app under a local uvicorn process and drives
+`/protected` and `/add` with concurrent async clients, then reports RPS, latency
+percentiles and error rates per endpoint. Everything runs on this machine.
+
+Run from the repository root (needs the `dev` extras: fastapi, uvicorn, httpx):
+    python examples/load_test.py --users 10000 --clients 32 --requests 5000
+    python examples/load_test.py --validation async --cache 1024
+
+Only `--tokens` users get real key pairs (key generation is slow); the vault is padded
+up to `--users` keys by re-using one public key, which is enough to measure the effect of
+vault size on loading and lookups.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tokenvault import TokenVault  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_vault(path: str, users: int, tokens: int) -> List[str]:
+    """Save a vault with `users` keys to `path` and return the tokens of the first `tokens` of them."""
+    vault = TokenVault()
+    issued = [token for _, token in vault.add_many(
+        ((f"user{i}@example.com", {"name": f"User {i}", "id": i}) for i in range(min(tokens, users))))]
+    filler = next(iter(vault.pool.values()), None)
+    for i in range(len(issued), users):
+        vault.pool[f"user{i}@example.com"] = filler
+    # Save unencrypted even if TOKENVAULT_PASSWORD is set: the server runs without it (see `start_server`)
+    saved_password = os.environ.pop("TOKENVAULT_PASSWORD", None)
+    try:
+        vault.save(path)
+    finally:
+        if saved_password is not None:
+            os.environ["TOKENVAULT_PASSWORD"] = saved_password
+    return issued
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, vault_path: str, validation: str, cache: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.pop("TOKENVAULT_PASSWORD", None)
+    env.update({
+        "TOKENVAULT_EXAMPLE_VAULT": vault_path,
+        "TOKENVAULT_EXAMPLE_VALIDATION": validation,
+        "TOKENVAULT_EXAMPLE_CACHE": str(cache),
+    })
+    command = [sys.executable, "-m", "uvicorn", "examples.fastapi_example:app",
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+async def wait_ready(url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                if (await client.get(f"{url}/public")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start in time")
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def drive(url: str, clients: int, requests: int, make_request) -> Dict[str, float]:
+    """Send `requests` requests from `clients` concurrent clients and summarize the results."""
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    response = await make_request(client)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        started = time.perf_counter()
+        tokens = build_vault(vault_path, args.users, args.tokens)
+        print(f"Built vault with {args.users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        port = args.port or free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(port, vault_path, args.validation, args.cache)
+        try:
+            await wait_ready(url, server)
+            results = {}
+            if args.requests:
+                results["/protected"] = await drive(url, args.clients, args.requests, lambda client: client.get(
+                    "/protected", headers={"Authorization": f"Bearer {random.choice(tokens)}"}))
+            if args.add_requests:
+                counter = iter(range(sys.maxsize))
+                results["/add"] = await drive(url, args.clients, args.add_requests, lambda client: client.post(
+                    "/add", params={"email": f"load{next(counter)}@example.com"}))
+            return results
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def report(results: Dict[str, Dict[str, float]], args):
+    print(f"users={args.users} clients={args.clients} validation={args.validation} cache={args.cache}")
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'err %':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<12}{r['requests']:>10}{r['errors']:>8}{r['error_rate'] * 100:>8.2f}{r['rps']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="number of keys in the vault")
+    parser.add_argument("--tokens", type=int, default=100, help="number of users with real tokens to send")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="requests to /protected (0 to skip)")
+    parser.add_argument("--add-requests", type=int, default=50, help="requests to /add (0 to skip)")
+    parser.add_argument("--validation", choices=["sync", "async"], default="sync",
+                        help="validate on the event loop (sync) or in the threadpool (async)")
+    parser.add_argument("--cache", type=int, default=0, help="validation cache size in the app (0 disables)")
+    parser.add_argument("--port", type=int, default=0, help="server port (default: a free port)")
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    args = parser.parse_args(argv)
+    if args.tokens < 1:
+        parser.error("--tokens must be at least 1")
+    if args.users < 1:
+        parser.error("--users must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results, args)
+
+
+if __name__ == "__main__":
+    main()
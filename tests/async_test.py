@@ -0,0 +1,85 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from tokenvault import TokenVault, VaultPersister
+
+
+def test_aload_asave():
+    async def main(path):
+        vault = TokenVault(compact=True)
+        token = vault.add("user@gmail.com", {"name": "Alon"})
+        await vault.asave(path, password="async passphrase")
+        assert vault.kdf_params is not None
+        loaded = await TokenVault.aload(path, password="async passphrase")
+        assert loaded.validate(token) == {"name": "Alon"}
+
+    with TemporaryDirectory() as tmp:
+        asyncio.run(main(os.path.join(tmp, "vault.db")))
+
+
+def test_asave_snapshot():
+    async def main(path):
+        vault = TokenVault()
+        vault.add("before@gmail.com")
+        save = asyncio.ensure_future(vault.asave(path))
+        await asyncio.sleep(0)
+        vault.add("after@gmail.com")
+        await save
+        assert list(TokenVault(path).pool) == ["before@gmail.com"]
+
+    with TemporaryDirectory() as tmp:
+        asyncio.run(main(os.path.join(tmp, "vault.db")))
+
+
+def test_persister_coalesces_saves():
+    async def main(path):
+        vault = TokenVault()
+        persister = VaultPersister(vault, path, delay=0.1)
+        tokens = [await persister.add("user0@gmail.com", {"i": 0})]
+        for i in range(1, 5):
+            tokens.append(vault.add(f"user{i}@gmail.com", {"i": i}))
+            persister.touch()
+        assert persister.remove("user0@gmail.com")
+        assert not persister.remove("user0@gmail.com")
+        assert not os.path.exists(path)
+        await asyncio.sleep(0.3)
+        assert persister.saves == 1
+        assert sorted(TokenVault(path).pool) == [f"user{i}@gmail.com" for i in range(1, 5)]
+
+        assert persister.revoke(tokens[1])
+        await persister.close()
+        assert persister.saves == 2
+        loaded = TokenVault(path)
+        assert loaded.validate(tokens[1]) is None
+        assert loaded.validate(tokens[2]) == {"i": 2}
+        await persister.close()
+        assert persister.saves == 2
+
+    with TemporaryDirectory() as tmp:
+        asyncio.run(main(os.path.join(tmp, "vault.db")))
+
+
+def test_persister_retries_failed_saves(monkeypatch, caplog):
+    async def main(path):
+        vault = TokenVault()
+        persister = VaultPersister(vault, path, delay=0.05)
+        asave = vault.asave
+        failures = []
+
+        async def failing_asave(*args, **kwargs):
+            if len(failures) < 2:
+                failures.append(1)
+                raise OSError("disk full")
+            return await asave(*args, **kwargs)
+
+        monkeypatch.setattr(vault, "asave", failing_asave)
+        token = await persister.add("user@gmail.com", {"i": 0})
+        await asyncio.sleep(0.5)
+        assert len(failures) == 2
+        assert persister.saves == 1
+        assert TokenVault(path).validate(token) == {"i": 0}
+        assert [record.exc_info[1].args for record in caplog.records] == [("disk full",)] * 2
+        await persister.close()
+
+    with TemporaryDirectory() as tmp:
+        asyncio.run(main(os.path.join(tmp, "vault.db")))
@@ -1,3 +1,5 @@
+import csv
+import json
 import tempfile
 import os
 import pytest
@@ -190,6 +192,109 @@ def test_password_protection():
             os.unlink(tmp_path)
 
 
+def test_import_export():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        users_path = os.path.join(tmp, "users.jsonl")
+        tokens_path = os.path.join(tmp, "tokens.jsonl")
+        with open(users_path, "w") as f:
+            for i in range(5):
+                f.write(json.dumps({"key": f"user{i}@example.com", "metadata": {"i": i}}) + "\n")
+        runner.invoke(app, ["init", vault_path])
+
+        import_result = runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path, "-w", "2"])
+        assert import_result.exit_code == 0
+        assert "Imported 5 keys" in import_result.stdout
+        with open(tokens_path) as f:
+            issued = [json.loads(line) for line in f]
+        vault = tokenvault.TokenVault(vault_path)
+        assert [row["key"] for row in issued] == [f"user{i}@example.com" for i in range(5)]
+        assert [vault.validate(row["token"]) for row in issued] == [{"i": i} for i in range(5)]
+
+        export_result = runner.invoke(app, ["export", vault_path])
+        assert export_result.exit_code == 0
+        exported = [json.loads(line) for line in export_result.stdout.splitlines()]
+        assert [row["key"] for row in exported] == [f"user{i}@example.com" for i in range(5)]
+        assert exported[0]["public_key"].encode() == vault.pool["user0@example.com"]
+
+
+def test_import_export_csv():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        users_path = os.path.join(tmp, "users.csv")
+        tokens_path = os.path.join(tmp, "tokens.jsonl")
+        export_path = os.path.join(tmp, "export.csv")
+        with open(users_path, "w") as f:
+            f.write("key,role\nadmin@example.com,admin\nuser@example.com,\n")
+        runner.invoke(app, ["init", vault_path])
+
+        runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path])
+        with open(tokens_path) as f:
+            issued = [json.loads(line) for line in f]
+        vault = tokenvault.TokenVault(vault_path)
+        assert [vault.validate(row["token"]) for row in issued] == [{"role": "admin"}, {}]
+
+        runner.invoke(app, ["export", vault_path, "-o", export_path])
+        with open(export_path) as f:
+            assert [row["key"] for row in csv.DictReader(f)] == ["admin@example.com", "user@example.com"]
+
+
+def test_import_invalid_input():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        users_path = os.path.join(tmp, "users.jsonl")
+        with open(users_path, "w") as f:
+            f.write('{"key": "user@example.com"}\n{"metadata": {}}\n')
+        runner.invoke(app, ["init", vault_path])
+
+        result = runner.invoke(app, ["import", users_path, vault_path, "-o", os.path.join(tmp, "tokens.jsonl")])
+        assert result.exit_code != 0
+        assert len(tokenvault.TokenVault(vault_path).pool) == 0
+
+
+def test_import_failure_keeps_previous_tokens():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        users_path = os.path.join(tmp, "users.jsonl")
+        tokens_path = os.path.join(tmp, "tokens.jsonl")
+        with open(tokens_path, "w") as f:
+            f.write("previous\n")
+        runner.invoke(app, ["init", vault_path])
+
+        with open(users_path, "w") as f:
+            for i in range(10):
+                f.write(json.dumps({"key": f"user{i}@example.com"}) + "\n")
+            f.write("not json\n")
+        result = runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path, "-w", "2"])
+        assert result.exit_code != 0
+        assert len(tokenvault.TokenVault(vault_path).pool) == 0
+        assert open(tokens_path).read() == "previous\n"
+        assert not [name for name in os.listdir(tmp) if name.endswith(".tmp")]
+
+        with open(users_path, "w") as f:
+            f.write('{"key": "user@example.com"}\n{"key": "other@example.com"}\n{"key": "user@example.com"}\n')
+        result = runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path])
+        assert result.exit_code != 0
+        assert "duplicate key" in result.output
+        assert len(tokenvault.TokenVault(vault_path).pool) == 0
+        assert open(tokens_path).read() == "previous\n"
+
+
+def test_revoke():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        vault = tokenvault.TokenVault()
+        token = vault.add("test@example.com")
+        vault.save(vault_path)
+
+        revoke_result = runner.invoke(app, ["revoke", token, vault_path])
+        assert revoke_result.exit_code == 0
+        assert "Token revoked" in revoke_result.stdout
+        assert "not valid" in runner.invoke(app, ["validate", token, vault_path]).stdout
+        assert "test@example.com" in runner.invoke(app, ["list", vault_path]).stdout
+        assert "not valid" in runner.invoke(app, ["revoke", token, vault_path]).stdout
+
+
 def test_version():
     result = runner.invoke(app, ["--version"])
     assert result.exit_code == 0
@@ -205,3 +310,37 @@ def test_help():
     assert "validate" in result.stdout
     assert "list" in result.stdout
     assert "encrypted" in result.stdout
+
+
+def test_import_rejects_existing_and_non_string_keys():
+    with tempfile.TemporaryDirectory() as tmp:
+        vault_path = os.path.join(tmp, "vault.db")
+        users_path = os.path.join(tmp, "users.csv")
+        tokens_path = os.path.join(tmp, "tokens.jsonl")
+        with open(users_path, "w") as f:
+            f.write("key,role\nadmin@example.com,admin\n")
+        runner.invoke(app, ["init", vault_path])
+        assert runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path]).exit_code == 0
+        with open(tokens_path) as f:
+            first = json.loads(f.readline())["token"]
+
+        result = runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path])
+        assert result.exit_code != 0
+        assert "--overwrite" in result.output
+        assert tokenvault.TokenVault(vault_path).validate(first) == {"role": "admin"}
+
+        result = runner.invoke(app, ["import", users_path, vault_path, "-o", tokens_path, "--overwrite"])
+        assert result.exit_code == 0
+        with open(tokens_path) as f:
+            second = json.loads(f.readline())["token"]
+        vault = tokenvault.TokenVault(vault_path)
+        assert vault.validate(first) is None
+        assert vault.validate(second) == {"role": "admin"}
+
+        jsonl_path = os.path.join(tmp, "users.jsonl")
+        with open(jsonl_path, "w") as f:
+            f.write('{"key": 7}\n')
+        result = runner.invoke(app, ["import", jsonl_path, vault_path, "-o", tokens_path])
+        assert result.exit_code != 0
+        assert "key must be a string" in result.output
+        assert list(tokenvault.TokenVault(vault_path).pool) == ["admin@example.com"]
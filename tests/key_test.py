@@ -18,3 +18,23 @@ def test_keys():
     assert vault.validate(token1) is None
 
     assert vault.add("test@gmail.com", {"test": "test"}) != token1
+
+
+def test_add_many():
+    vault = TokenVault()
+    users = ((f"user{i}@gmail.com", {"i": i}) for i in range(10))
+    tokens = list(vault.add_many(users, workers=3))
+    assert [key for key, _ in tokens] == [f"user{i}@gmail.com" for i in range(10)]
+    assert [vault.validate(token) for _, token in tokens] == [{"i": i} for i in range(10)]
+
+
+def test_revoke():
+    vault = TokenVault()
+    token1 = vault.add("test@gmail.com", {"test": "test"})
+    token2 = vault.add("test2@gmail.com", {"test2": "test2"})
+    assert vault.revoke(token1)
+    assert not vault.revoke(token1)
+    assert not vault.revoke("invalid==token")
+    assert vault.validate(token1) is None
+    assert vault.validate(token2) == {"test2": "test2"}
+    assert "test@gmail.com" in vault.pool
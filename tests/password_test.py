@@ -1,7 +1,14 @@
+import base64
+import io
+import json
 from tempfile import NamedTemporaryFile
+import cryptography.exceptions
 from tokenvault import TokenVault
 import pytest
 import os
+import sys
+import types
+from tokenvault import crypto
 from tokenvault.config import CONSTANTS
 
 
@@ -59,3 +66,182 @@ def test_vault_password_wrong():
     vault.save(file.name, password=password)
     with pytest.raises(ValueError):
         TokenVault(file.name, password=TokenVault.generate_key())
+
+
+def test_vault_passphrase():
+    vault = TokenVault()
+    metadata = {"name": 'Alon'}
+    alon_token = vault.add('user@gmail.com', metadata)
+    file = NamedTemporaryFile()
+    vault.save(file.name, password="correct horse battery staple")
+    assert open(file.name, "rb").read().startswith(crypto.CHUNKED_MAGIC)
+    with pytest.raises(ValueError):
+        TokenVault(file.name)
+    with pytest.raises(ValueError):
+        TokenVault(file.name, password="wrong horse battery staple")
+    loaded = TokenVault(file.name, password="correct horse battery staple")
+    assert loaded.validate(alon_token) == metadata
+    assert loaded.kdf_params == vault.kdf_params
+
+
+def test_vault_passphrase_derived_key_cache():
+    vault = TokenVault()
+    file = NamedTemporaryFile()
+    vault.save(file.name, password="cached passphrase")
+    misses = crypto._scrypt.cache_info().misses
+    loaded = TokenVault(file.name, password="cached passphrase")
+    loaded.save(file.name, password="cached passphrase")
+    TokenVault(file.name, password="cached passphrase")
+    assert crypto._scrypt.cache_info().misses == misses
+
+
+def test_vault_passphrase_keyring(monkeypatch):
+    store = {}
+    keyring = types.SimpleNamespace(
+        get_password=lambda service, name: store.get((service, name)),
+        set_password=lambda service, name, value: store.__setitem__((service, name), value),
+    )
+    monkeypatch.setitem(sys.modules, "keyring", keyring)
+    monkeypatch.setenv(CONSTANTS.TOKENVAULT_KEYRING, "1")
+    monkeypatch.setattr(crypto, "_unlocked", {})
+    vault = TokenVault()
+    token = vault.add('user@gmail.com', {"name": 'Alon'})
+    file = NamedTemporaryFile()
+    vault.save(file.name, password="keyring passphrase")
+    # The entry is named by the public header only, nothing derived from the passphrase
+    with open(file.name, "rb") as f:
+        params = crypto.read_chunked_header(f)[2]
+    assert list(store) == [(CONSTANTS.KEYRING_SERVICE, f"{params['salt']}:{params['n']}:{params['r']}:{params['p']}")]
+
+    crypto._scrypt.cache_clear()
+    loaded = TokenVault(file.name, password="keyring passphrase")
+    assert loaded.validate(token) == {"name": 'Alon'}
+    loaded.save(file.name, password="keyring passphrase")
+    assert crypto._scrypt.cache_info().misses == 0
+
+    # A stale entry that does not decrypt the vault is ignored and replaced
+    entry = next(iter(store))
+    verifier = store[entry].rpartition(":")[2]
+    store[entry] = f"{TokenVault.generate_key().decode()}:{verifier}"
+    crypto._scrypt.cache_clear()
+    crypto._unlocked.clear()
+    assert TokenVault(file.name, password="keyring passphrase").validate(token) == {"name": 'Alon'}
+    assert crypto._scrypt.cache_info().misses == 1
+    crypto._unlocked.clear()
+    TokenVault(file.name, password="keyring passphrase")
+    assert crypto._scrypt.cache_info().misses == 1
+
+    # The entry only unlocks the vault for the passphrase it was derived from, and a wrong one does not replace it
+    cached = dict(store)
+    with pytest.raises(ValueError):
+        TokenVault(file.name, password="other passphrase")
+    assert store == cached
+    with pytest.raises(ValueError):
+        TokenVault(file.name, password="other passphrase")
+
+
+def test_vault_passphrase_change(monkeypatch):
+    store = {}
+    keyring = types.SimpleNamespace(
+        get_password=lambda service, name: store.get((service, name)),
+        set_password=lambda service, name, value: store.__setitem__((service, name), value),
+    )
+    monkeypatch.setitem(sys.modules, "keyring", keyring)
+    monkeypatch.setenv(CONSTANTS.TOKENVAULT_KEYRING, "1")
+    monkeypatch.setattr(crypto, "_unlocked", {})
+    vault = TokenVault()
+    token = vault.add('user@gmail.com', {"name": 'Alon'})
+    file = NamedTemporaryFile()
+    vault.save(file.name, password="old passphrase")
+    old_params = vault.kdf_params
+
+    loaded = TokenVault(file.name, password="old passphrase")
+    loaded.save(file.name, password="new passphrase")
+    assert loaded.kdf_params["salt"] != old_params["salt"]
+    assert TokenVault(file.name, password="new passphrase").validate(token) == {"name": 'Alon'}
+    with pytest.raises(ValueError):
+        TokenVault(file.name, password="old passphrase")
+
+
+def test_vault_rejects_non_string_keys():
+    password = TokenVault.generate_key()
+    file = NamedTemporaryFile()
+    for record in (["k", 7, ""], ["t", 7]):
+        data = b"".join(crypto.encrypt_chunked([json.dumps(record).encode() + b"\n"], password))
+        open(file.name, "wb").write(data)
+        with pytest.raises(ValueError, match="corrupted"):
+            TokenVault(file.name, password=password)
+
+
+def test_vault_legacy_formats():
+    vault = TokenVault()
+    token = vault.add('user@gmail.com', {"name": 'Alon'})
+    data = json.dumps({key: base64.b64encode(value).decode() for key, value in vault.pool.items()}).encode()
+    password = TokenVault.generate_key()
+    file = NamedTemporaryFile()
+    open(file.name, "wb").write(TokenVault.encrypt(data, password))
+    assert TokenVault(file.name, password=password).validate(token) == {"name": 'Alon'}
+
+    params = crypto.new_kdf_params()
+    key = crypto.derive_key("legacy passphrase", params)
+    open(file.name, "wb").write(crypto.pack_kdf(params, TokenVault.encrypt(data, key)))
+    loaded = TokenVault(file.name, password="legacy passphrase")
+    assert loaded.validate(token) == {"name": 'Alon'}
+    loaded.save(file.name, password="legacy passphrase")
+    assert open(file.name, "rb").read().startswith(crypto.CHUNKED_MAGIC)
+    assert TokenVault(file.name, password="legacy passphrase").validate(token) == {"name": 'Alon'}
+
+
+@pytest.mark.parametrize("size", [0, 1, 99, 100, 101, 1000])
+def test_chunked_roundtrip(size):
+    password = TokenVault.generate_key()
+    plaintext = os.urandom(size)
+    pieces = [plaintext[i:i + 7] for i in range(0, size, 7)]
+    data = b"".join(crypto.encrypt_chunked(pieces, password, chunk_size=100))
+    assert len(data) < size + 300
+    for workers in (1, 3):
+        _, chunks = crypto.decrypt_chunked(io.BytesIO(data), password, workers=workers)
+        assert b"".join(chunks) == plaintext
+
+
+def test_chunked_tampering():
+    password = TokenVault.generate_key()
+    data = b"".join(crypto.encrypt_chunked([os.urandom(1000)], password, chunk_size=100))
+    header_size = len(data) - 10 * 116 - 16
+    with pytest.raises(ValueError):
+        b"".join(crypto.decrypt_chunked(io.BytesIO(data[:header_size + 10 * 116]), password)[1])
+    with pytest.raises(cryptography.exceptions.InvalidTag):
+        b"".join(crypto.decrypt_chunked(io.BytesIO(data[:header_size + 5 * 116 + 50]), password)[1])
+    swapped = data[:header_size] + data[header_size + 116:header_size + 232] + data[header_size:header_size + 116] \
+        + data[header_size + 232:]
+    with pytest.raises(cryptography.exceptions.InvalidTag):
+        b"".join(crypto.decrypt_chunked(io.BytesIO(swapped), password)[1])
+
+
+def test_vault_chunked_workers():
+    vault = TokenVault()
+    tokens = [vault.add(f'user{i}@gmail.com', {"i": i}) for i in range(20)]
+    password = TokenVault.generate_key()
+    file = NamedTemporaryFile()
+    vault.save(file.name, password=password)
+    loaded = TokenVault(file.name, password=password, workers=4, compact=True)
+    assert list(loaded.pool) == list(vault.pool)
+    assert [loaded.validate(token) for token in tokens] == [{"i": i} for i in range(20)]
+
+
+@pytest.mark.parametrize("encrypted", [False, True])
+def test_vault_revocations_persistence(encrypted):
+    password = TokenVault.generate_key() if encrypted else None
+    vault = TokenVault()
+    revoked = vault.add('revoked@gmail.com', {"name": 'Revoked'})
+    valid = vault.add('user@gmail.com', {"name": 'Alon'})
+    file = NamedTemporaryFile()
+    vault.save(file.name, password=password)
+    assert TokenVault(file.name, password=password).revoked == set()
+    assert vault.revoke(revoked)
+    vault.save(file.name, password=password)
+    loaded = TokenVault(file.name, password=password)
+    assert loaded.revoked == vault.revoked
+    assert loaded.validate(revoked) is None
+    assert loaded.validate(valid) == {"name": 'Alon'}
+    assert list(loaded.pool) == ['revoked@gmail.com', 'user@gmail.com']
@@ -0,0 +1,80 @@
+from tempfile import NamedTemporaryFile
+import pytest
+from tokenvault import TokenVault, CompactPool
+from tokenvault.pool import PEM_FOOTER, PEM_HEADER, pem_to_der
+
+
+def test_compact_vault_add_validate():
+    vault = TokenVault(compact=True)
+    assert isinstance(vault.pool, CompactPool)
+    token = vault.add("test@gmail.com", {"test": "test"})
+    assert vault.validate(token) == {"test": "test"}
+    assert vault.remove("test@gmail.com")
+    assert vault.validate(token) is None
+    assert len(vault.pool) == 0
+
+
+def test_compact_vault_persistence():
+    vault = TokenVault()
+    tokens = {f"user{i}@gmail.com": vault.add(f"user{i}@gmail.com", {"i": i}) for i in range(3)}
+    file = NamedTemporaryFile()
+    vault.save(file.name)
+
+    compact = TokenVault(file.name, compact=True)
+    assert isinstance(compact.pool, CompactPool)
+    assert list(compact.pool.keys()) == list(tokens)
+    for i, token in enumerate(tokens.values()):
+        assert compact.validate(token) == {"i": i}
+    assert dict(compact.pool.items()) == dict(vault.pool.items())
+
+    other = NamedTemporaryFile()
+    compact.save(other.name)
+    assert open(other.name, "rb").read() == open(file.name, "rb").read()
+
+
+def test_compact_pool_mapping():
+    pool = CompactPool()
+    for i in range(4000):
+        pool[f"key{i}"] = f"value{i}".encode()
+    assert len(pool) == 4000
+    assert pool["key1234"] == b"value1234"
+    pool["key1235"] = b"updated"
+    assert pool["key1235"] == b"updated"
+    for i in range(4000):
+        if i % 4:
+            del pool[f"key{i}"]
+    assert len(pool) == 1000
+    assert "key2" not in pool
+    assert "key4" in pool
+    assert pool.get("key2") is None
+    with pytest.raises(KeyError):
+        pool["key2"]
+    assert list(pool)[:3] == ["key0", "key4", "key8"]
+    assert pool["key1236"] == b"value1236"
+    pool["key2"] = b"back"
+    assert pool["key2"] == b"back"
+    assert len(pool) == 1001
+
+
+def test_compact_pool_reclaims_overwrites():
+    pool = CompactPool()
+    pool["other"] = b"x" * 100
+    for i in range(20000):
+        pool["key"] = bytes([i % 256]) * 100
+    assert len(pool) == 2
+    assert pool["key"] == bytes([19999 % 256]) * 100
+    assert pool["other"] == b"x" * 100
+    assert len(pool._values) < 2 * (1 << 16)
+
+
+def test_compact_pool_keeps_non_canonical_pem():
+    vault = TokenVault()
+    vault.add("test@gmail.com")
+    pem = vault.pool["test@gmail.com"]
+    body = pem[len(PEM_HEADER):-len(PEM_FOOTER)]
+    assert pem_to_der(pem) is not None
+    unwrapped = PEM_HEADER + body.replace(b"\n", b"") + b"\n" + PEM_FOOTER
+    assert pem_to_der(unwrapped) is None
+    pool = CompactPool({"canonical": pem, "unwrapped": unwrapped})
+    assert pool["canonical"] == pem
+    assert pool["unwrapped"] == unwrapped
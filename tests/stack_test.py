@@ -0,0 +1,95 @@
+import os
+from tempfile import TemporaryDirectory
+import pytest
+from tokenvault import CompactPool, TokenVault, VaultStack
+
+
+def test_stack_precedence_and_tombstones():
+    base, overlay = TokenVault(), TokenVault()
+    alice_base = base.add("alice@gmail.com", {"layer": "base"})
+    bob = base.add("bob@gmail.com", {"layer": "base"})
+    carol = base.add("carol@gmail.com", {"layer": "base"})
+    alice_overlay = overlay.add("alice@gmail.com", {"layer": "overlay"})
+    dave = overlay.add("dave@gmail.com", {"layer": "overlay"})
+    assert overlay.tombstone("bob@gmail.com")
+    assert not overlay.tombstone("bob@gmail.com")
+
+    stack = VaultStack([base, overlay])
+    assert stack.validate(alice_overlay) == {"layer": "overlay"}
+    assert stack.validate(alice_base) is None
+    assert stack.validate(bob) is None
+    assert stack.validate(carol) == {"layer": "base"}
+    assert stack.validate(dave) == {"layer": "overlay"}
+    assert sorted(stack) == ["alice@gmail.com", "carol@gmail.com", "dave@gmail.com"]
+
+    assert stack.revoke(carol)
+    assert not stack.revoke(carol)
+    assert len(overlay.revoked) == 1 and not base.revoked
+    assert stack.validate(carol) is None
+    stack.replace(1, overlay)
+    assert stack.validate(carol) is None
+
+
+def test_stack_incremental_reload():
+    with TemporaryDirectory() as tmp:
+        base_path, overlay_path = os.path.join(tmp, "base.db"), os.path.join(tmp, "overlay.db")
+        base, overlay = TokenVault(), TokenVault()
+        alice = base.add("alice@gmail.com", {"layer": "base"})
+        bob = base.add("bob@gmail.com", {"layer": "base"})
+        base.save(base_path)
+        password = TokenVault.generate_key()
+        overlay.save(overlay_path, password=password)
+
+        stack = VaultStack.from_paths([base_path, overlay_path], password=[None, password])
+        assert stack.validate(alice) == {"layer": "base"}
+        assert stack.refresh() == []
+
+        with TokenVault.edit(overlay_path, password=password) as vault:
+            vault.tombstone("alice@gmail.com")
+            carol = vault.add("carol@gmail.com", {"layer": "overlay"})
+        assert stack.refresh() == [1]
+        assert stack.validate(alice) is None
+        assert stack.validate(bob) == {"layer": "base"}
+        assert stack.validate(carol) == {"layer": "overlay"}
+
+        with TokenVault.edit(overlay_path, password=password) as vault:
+            vault.tombstones.discard("alice@gmail.com")
+        stack.reload(1)
+        assert stack.validate(alice) == {"layer": "base"}
+
+
+def test_stack_reload_requires_path():
+    stack = VaultStack([TokenVault()])
+    with pytest.raises(ValueError):
+        stack.reload(0)
+
+
+def test_stack_readd_lifts_tombstone():
+    base, overlay = TokenVault(), TokenVault()
+    alice_base = base.add("alice@gmail.com", {"layer": "base"})
+    assert overlay.tombstone("alice@gmail.com")
+    alice_overlay = overlay.add("alice@gmail.com", {"layer": "overlay"})
+    assert not overlay.tombstones
+    assert overlay.remove("alice@gmail.com")
+
+    stack = VaultStack([base, overlay])
+    assert stack.validate(alice_base) == {"layer": "base"}
+    assert stack.validate(alice_overlay) is None
+
+
+def test_stack_compact_index():
+    with TemporaryDirectory() as tmp:
+        base_path, overlay_path = os.path.join(tmp, "base.db"), os.path.join(tmp, "overlay.db")
+        base, overlay = TokenVault(), TokenVault()
+        alice = base.add("alice@gmail.com", {"layer": "base"})
+        bob = base.add("bob@gmail.com", {"layer": "base"})
+        bob_overlay = overlay.add("bob@gmail.com", {"layer": "overlay"})
+        base.save(base_path)
+        overlay.save(overlay_path)
+
+        stack = VaultStack.from_paths([base_path, overlay_path], compact=True)
+        assert all(isinstance(layer.pool, CompactPool) for layer in stack.layers)
+        assert stack.validate(alice) == {"layer": "base"}
+        assert stack.validate(bob) is None
+        assert stack.validate(bob_overlay) == {"layer": "overlay"}
+        assert sorted(stack) == ["alice@gmail.com", "bob@gmail.com"]
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from tempfile import TemporaryDirectory
+import pytest
+from tokenvault import TokenVault, VaultWriter
+
+
+def test_atomic_save_leaves_no_temp_files():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault.db")
+        vault = TokenVault()
+        token = vault.add("user@gmail.com", {"name": "Alon"})
+        vault.save(path)
+        vault.save(path)
+        assert os.listdir(tmp) == ["vault.db"]
+        assert TokenVault(path).validate(token) == {"name": "Alon"}
+
+
+def test_edit_concurrent():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault.db")
+
+        def add(i):
+            with TokenVault.edit(path) as vault:
+                vault.add(f"user{i}@gmail.com")
+
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(TokenVault(path).pool) == 8
+
+
+def test_writer_group_commit():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault.db")
+        password = TokenVault.generate_key()
+        tokens = {}
+        with VaultWriter(path, password=password) as writer:
+            tokens["first@gmail.com"] = writer.add("first@gmail.com", {"i": -1})
+            assert writer.commits == 1
+
+            def add(i):
+                tokens[f"user{i}@gmail.com"] = writer.add(f"user{i}@gmail.com", {"i": i})
+
+            threads = [threading.Thread(target=add, args=(i,)) for i in range(16)]
+            with TokenVault.lock(path):
+                for thread in threads:
+                    thread.start()
+                while writer._queue.qsize() < 15:
+                    time.sleep(0.01)
+            for thread in threads:
+                thread.join()
+            assert writer.commits == 2
+
+            assert writer.remove("first@gmail.com")
+            assert not writer.remove("first@gmail.com")
+
+        vault = TokenVault(path, password=password)
+        assert len(vault.pool) == 16
+        assert vault.validate(tokens["first@gmail.com"]) is None
+        for i in range(16):
+            assert vault.validate(tokens[f"user{i}@gmail.com"]) == {"i": i}
+
+
+def test_writer_picks_up_external_changes():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault.db")
+        with VaultWriter(path) as writer:
+            writer.add("writer@gmail.com")
+            with TokenVault.edit(path) as vault:
+                vault.add("cli@gmail.com")
+            writer.add("writer2@gmail.com")
+        assert sorted(TokenVault(path).pool) == ["cli@gmail.com", "writer2@gmail.com", "writer@gmail.com"]
+
+
+def test_writer_failure_fails_batch_and_keeps_serving():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "missing", "vault.db")
+        with VaultWriter(path) as writer:
+            with pytest.raises(FileNotFoundError):
+                writer.remove("user@gmail.com")
+            os.mkdir(os.path.dirname(path))
+            token = writer.add("user@gmail.com", {"name": "Alon"})
+        assert TokenVault(path).validate(token) == {"name": "Alon"}
@@ -1,10 +1,19 @@
+import asyncio
+import functools
 import os
 import pathlib
 import json
 import base64
-from collections import defaultdict
-from typing import Optional, Dict, Any
+import binascii
+import contextlib
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    AbstractSet, Optional, Dict, Any, BinaryIO, ContextManager, Deque, Iterable, Iterator, Mapping, MutableMapping,
+    Set, Tuple, Union,
+)
 
+import cryptography.exceptions
 import cryptography.fernet
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives.asymmetric import rsa
@@ -12,58 +21,217 @@ from cryptography.hazmat.primitives import serialization
 import jwt
 import uuid
 from tokenvault.config import CONSTANTS
+from tokenvault import crypto, storage
+from tokenvault.pool import CompactPool
 import importlib.metadata
 
 __version__ = importlib.metadata.version("tokenvault")
 
+ENCRYPTED_ERROR_MSG = "File is encrypted: please provide password or set `TOKENVAULT_PASSWORD`"
+RECORD_KEY = "k"
+RECORD_REVOKED = "r"
+RECORD_TOMBSTONE = "t"
+FORMAT_KEY = "__tokenvault__"
+FORMAT_VERSION = 2
+
 
 class TokenVault:
     ALGORITHM = "RS256"
     DELIMITER = '=='
 
-    def __init__(self, path: Optional[str] = None, password: Optional[str] = None):
-        pool = defaultdict(dict)
+    def __init__(self, path: Optional[str] = None, password: Optional[str] = None, compact: bool = False,
+                 workers: int = 1):
+        self.pool: MutableMapping[str, bytes] = CompactPool() if compact else defaultdict(dict)
+        self.revoked: Set[Union[bytes, str]] = set()
+        self.tombstones: Set[str] = set()
+        self.kdf_params: Optional[Dict[str, Any]] = None
+        self._kdf_password: Optional[str] = None
         if path:
-            pool = self.load_pool(path=path, password=password)
-        self.pool = pool
+            self._load(path=path, password=password, workers=workers)
 
     @classmethod
-    def load_pool(cls, path: str, password: Optional[str] = None) -> Dict[str, bytes]:
-        """Load and decrypt a vault from disk."""
+    def load_pool(cls, path: str, password: Optional[str] = None, compact: bool = False,
+                  workers: int = 1) -> MutableMapping[str, bytes]:
+        """
+        Load and decrypt a vault from disk.
+        :param compact: store the pool in a `CompactPool` (contiguous buffers, decoded on access)
+        instead of a dict, for large vaults where memory matters more than lookup speed.
+        :param workers: number of threads decrypting chunks of an encrypted vault concurrently.
+        Only decryption runs in parallel; parsing the records holds the GIL, so this rarely
+        shortens a load by much (AES-GCM is already fast next to JSON parsing).
+        """
+        return cls(path, password=password, compact=compact, workers=workers).pool
+
+    def _load(self, path: str, password: Optional[str] = None, workers: int = 1):
+        """Load a vault file into this (empty) vault."""
         vault_path = pathlib.Path(path)
         if not vault_path.exists():
             raise FileNotFoundError(f"Vault file not found: {path}")
-        data = vault_path.read_bytes()
         password = password or os.getenv(CONSTANTS.TOKENVAULT_PASSWORD)
+        # Sniff and parse from the same handle: an atomic replace between two opens could swap the file
+        with vault_path.open("rb") as f:
+            if f.read(len(crypto.CHUNKED_MAGIC)) == crypto.CHUNKED_MAGIC:
+                f.seek(0)
+                return self._load_chunked(f, password, workers=workers)
+            f.seek(0)
+            self._load_legacy(f.read(), password)
+
+    def _load_legacy(self, data: bytes, password: Optional[str]):
+        """Load a whole-file vault: plain JSON, or a Fernet token with an optional KDF header."""
+        kdf_params, data = crypto.unpack_kdf(data)
+        if kdf_params is not None and not password:
+            raise ValueError(ENCRYPTED_ERROR_MSG)
         if password:
-            try:
-                data = cls.decrypt(data, password)
-            except cryptography.fernet.InvalidToken:
-                raise ValueError("Provided password is invalid")
+            data = self._decrypt_legacy(data, password, kdf_params)
         try:
             pool_json = json.loads(data)
-            pool = defaultdict(dict)
+            if pool_json.get(FORMAT_KEY) == FORMAT_VERSION:
+                self.revoked.update(self._revocation_id(claim) for claim in pool_json.get("revoked", []))
+                self.tombstones.update(pool_json.get("tombstones", []))
+                pool_json = pool_json["keys"]
             for key, value in pool_json.items():
-                pool[key] = base64.b64decode(value)
-            return pool
-        except (json.JSONDecodeError, ValueError):
-            raise ValueError(
-                "File is encrypted: please provide password or set `TOKENVAULT_PASSWORD`"
-            )
+                self.pool[key] = binascii.a2b_base64(value)
+            self.kdf_params, self._kdf_password = kdf_params, password
+        except (json.JSONDecodeError, ValueError, TypeError, AttributeError, KeyError):
+            raise ValueError(ENCRYPTED_ERROR_MSG)
+
+    @classmethod
+    def _decrypt_legacy(cls, data: bytes, password: str, kdf_params: Optional[Dict[str, Any]]) -> bytes:
+        def opens(candidate: bytes) -> bool:
+            try:
+                cls.decrypt(data, candidate)
+            except (cryptography.fernet.InvalidToken, ValueError):
+                return False
+            return True
+
+        key = password if kdf_params is None else crypto.derive_key(password, kdf_params, check=opens)
+        try:
+            return cls.decrypt(data, key)
+        except cryptography.fernet.InvalidToken:
+            raise ValueError("Provided password is invalid")
+
+    def _load_chunked(self, f: BinaryIO, password: Optional[str], workers: int = 1):
+        """Stream-decrypt a chunked vault and parse its records chunk by chunk."""
+        if not password:
+            raise ValueError(ENCRYPTED_ERROR_MSG)
+        self.kdf_params, chunks = crypto.decrypt_chunked(f, password, workers=workers)
+        self._kdf_password = password
+        tail = b""
+        try:
+            for chunk in chunks:
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                for line in lines:
+                    self._apply_record(json.loads(line))
+        except cryptography.exceptions.InvalidTag:
+            raise ValueError("Provided password is invalid")
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            raise ValueError("Vault file is corrupted")
+        if tail:
+            raise ValueError("Vault file is corrupted")
+
+    def _apply_record(self, record: list):
+        if record[0] in (RECORD_KEY, RECORD_TOMBSTONE) and not isinstance(record[1], str):
+            raise ValueError("Vault file is corrupted")
+        if record[0] == RECORD_KEY:
+            self.pool[record[1]] = binascii.a2b_base64(record[2])
+        elif record[0] == RECORD_REVOKED:
+            self.revoked.add(self._revocation_id(record[1]))
+        elif record[0] == RECORD_TOMBSTONE:
+            self.tombstones.add(record[1])
+        else:
+            raise ValueError(f"Unsupported vault record: {record[0]}")
+
+    def _records(self) -> Iterator[bytes]:
+        """Serialize the vault as JSON lines, the plaintext of the chunked container."""
+        for key, value in self.pool.items():
+            yield json.dumps([RECORD_KEY, key, base64.b64encode(value).decode("ascii")]).encode("utf-8") + b"\n"
+        for claim in self._revoked_claims():
+            yield json.dumps([RECORD_REVOKED, claim]).encode("utf-8") + b"\n"
+        for key in self.tombstones:
+            yield json.dumps([RECORD_TOMBSTONE, key]).encode("utf-8") + b"\n"
 
     def save(self, path: str, password: Optional[str] = None) -> str:
-        """Encrypt and save the vault to disk."""
+        """
+        Encrypt and save the vault to disk.
+        Without a password the vault is plain JSON. With one, it is streamed into the chunked
+        container (independently authenticated AES-GCM chunks, see `crypto.encrypt_chunked`).
+        A `generate_key()` key is used directly; any other password is treated as a passphrase
+        and stretched with scrypt, whose salt and parameters are stored in the file header.
+        The header of a loaded vault is reused when saving with the same password, so that hits
+        the derived-key cache; a different password gets a fresh salt.
+        """
         password = password or os.getenv(CONSTANTS.TOKENVAULT_PASSWORD)
-        pool_json = {
-            key: base64.b64encode(value).decode("ascii")
-            for key, value in self.pool.items()
-        }
-        data = json.dumps(pool_json).encode("utf-8")
-        if password:
-            data = self.encrypt(data, password)
-        pathlib.Path(path).write_bytes(data)
+        if not password:
+            pool_json = {
+                key: base64.b64encode(value).decode("ascii")
+                for key, value in self.pool.items()
+            }
+            if self.revoked or self.tombstones:
+                # Vaults without revocations or tombstones keep the original flat `key -> public key` layout
+                pool_json = {
+                    FORMAT_KEY: FORMAT_VERSION,
+                    "keys": pool_json,
+                    "revoked": list(self._revoked_claims()),
+                    "tombstones": sorted(self.tombstones),
+                }
+            storage.atomic_write(path, json.dumps(pool_json).encode("utf-8"))
+            return path
+        if self.kdf_params is None or password != self._kdf_password:
+            self.kdf_params = None if crypto.is_fernet_key(password) else crypto.new_kdf_params()
+            self._kdf_password = password
+        storage.atomic_write(path, crypto.encrypt_chunked(self._records(), password, self.kdf_params))
+        return path
+
+    @classmethod
+    async def aload(cls, path: str, password: Optional[str] = None, compact: bool = False,
+                    workers: int = 1) -> "TokenVault":
+        """Load a vault in the default executor, so reading, decrypting and parsing never block the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(cls, path, password=password, compact=compact, workers=workers))
+
+    async def asave(self, path: str, password: Optional[str] = None) -> str:
+        """
+        Save the vault in the default executor. The vault is snapshotted on the event loop first,
+        so `add` and `remove` calls made while the save runs are safe (and saved next time).
+        The snapshot (`copy`) does block the loop for O(n): roughly 45 ms per million keys with
+        the default dict pool, and about four times that with a `CompactPool`, whose value buffer
+        is copied whole. For very large vaults, save less often.
+        """
+        snapshot = self.copy()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(snapshot.save, path, password=password))
+        self.kdf_params, self._kdf_password = snapshot.kdf_params, snapshot._kdf_password
         return path
 
+    def copy(self) -> "TokenVault":
+        """A shallow snapshot of the vault whose keys, revocations and tombstones can change independently."""
+        vault = type(self).__new__(type(self))
+        vault.pool = self.pool.copy()
+        vault.revoked = set(self.revoked)
+        vault.tombstones = set(self.tombstones)
+        vault.kdf_params, vault._kdf_password = self.kdf_params, self._kdf_password
+        return vault
+
+    @staticmethod
+    def lock(path: str) -> ContextManager[None]:
+        """Exclusive advisory lock (on a `<path>.lock` sidecar) for read-modify-write of a vault file."""
+        return storage.file_lock(path)
+
+    @classmethod
+    @contextlib.contextmanager
+    def edit(cls, path: str, password: Optional[str] = None, compact: bool = False) -> Iterator["TokenVault"]:
+        """
+        Load the vault at `path` under its lock and save it back when the block exits without error,
+        so concurrent edits from other threads or processes are never lost.
+        A missing file starts as an empty vault.
+        """
+        with cls.lock(path):
+            vault = cls(path, password=password, compact=compact) if os.path.exists(path) else cls(compact=compact)
+            yield vault
+            vault.save(path, password=password)
+
     @classmethod
     def generate_key(cls) -> bytes:
         """Generate a random encryption key."""
@@ -86,6 +254,43 @@ class TokenVault:
         :param metadata: any metadata you want provided at validation time
         :return: A Token which validates the key
         """
+        public_key_bytes, token = self._issue(key, metadata)
+        self._put(key, public_key_bytes)
+        return token
+
+    def add_many(self, items: Iterable[Tuple[str, Optional[Dict[str, Any]]]],
+                 workers: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Add many keys, generating their RSA keys on a thread pool.
+        Items are consumed lazily and results are yielded in input order,
+        so arbitrarily large inputs are processed in bounded memory.
+        :param items: (key, metadata) pairs
+        :param workers: number of key-generation threads (default: CPU count)
+        :return: an iterator of (key, token); keys are added to the vault as it is consumed
+        """
+        workers = workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending: Deque[Tuple[str, Future]] = deque()
+            for key, metadata in items:
+                pending.append((key, executor.submit(self._issue, key, metadata)))
+                if len(pending) >= 4 * workers:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    def _collect(self, key: str, future: Future) -> Tuple[str, str]:
+        public_key_bytes, token = future.result()
+        self._put(key, public_key_bytes)
+        return key, token
+
+    def _put(self, key: str, public_key_bytes: bytes):
+        """Store a public key; re-adding a key also lifts its tombstone."""
+        self.pool[key] = public_key_bytes
+        self.tombstones.discard(key)
+
+    @classmethod
+    def _issue(cls, key: str, metadata: Optional[Dict[str, Any]] = None) -> Tuple[bytes, str]:
+        """Generate a key pair for `key`: returns the PEM public key to store and the signed token."""
         if not key:
             raise ValueError("key cannot be empty")
         metadata = metadata.copy() if metadata else {}
@@ -101,26 +306,82 @@ class TokenVault:
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo
         )
-        self.pool[key] = public_key_bytes
-        return jwt.encode(metadata, private_key, algorithm=TokenVault.ALGORITHM) + f"{TokenVault.DELIMITER}{key}"
+        return public_key_bytes, jwt.encode(metadata, private_key, algorithm=cls.ALGORITHM) + f"{cls.DELIMITER}{key}"
 
     def remove(self, key: str) -> bool:
         """Remove a key from the vault. Returns True if key existed, False otherwise."""
         return self.pool.pop(key, None) is not None
 
+    def tombstone(self, key: str) -> bool:
+        """
+        Remove a key and record a tombstone for it, which hides the key in the layers below
+        this vault when it is used as an overlay in a `VaultStack`.
+        The tombstone stays until the key is added again.
+        Returns True if anything changed, False if the key was already tombstoned.
+        """
+        removed = self.remove(key)
+        if key in self.tombstones:
+            return removed
+        self.tombstones.add(key)
+        return True
+
     def validate(self, token: str) -> Optional[Dict[str, Any]]:
         """
         Validate a token and return its metadata.
         :param token: The token to validate
-        :return: None if the token is invalid, otherwise a dict with the metadata
+        :return: None if the token is invalid or revoked, otherwise a dict with the metadata
         """
-        split = token.split(TokenVault.DELIMITER, 1)
-        if len(split) != 2 or split[1] not in self.pool:
+        return self._validate(token, self.pool, self.revoked)
+
+    @classmethod
+    def _validate(cls, token: str, keys: Mapping[str, bytes],
+                  revoked: AbstractSet[Union[bytes, str]]) -> Optional[Dict[str, Any]]:
+        meta = cls._decode(token, keys)
+        if meta is None:
+            return None
+        claim = meta.pop(CONSTANTS.VALID, None)
+        if claim is None or (revoked and cls._revocation_id(claim) in revoked):
+            return None
+        return meta
+
+    def revoke(self, token: str) -> bool:
+        """
+        Revoke a single token, leaving the key and its other tokens valid.
+        :param token: The token to revoke
+        :return: True if the token was valid and is now revoked, False otherwise
+        """
+        meta = self._decode(token, self.pool)
+        claim = meta.get(CONSTANTS.VALID) if meta is not None else None
+        if claim is None or self._revocation_id(claim) in self.revoked:
+            return False
+        self.revoked.add(self._revocation_id(claim))
+        return True
+
+    @classmethod
+    def _decode(cls, token: str, keys: Mapping[str, bytes]) -> Optional[Dict[str, Any]]:
+        """Verify the token signature against its public key in `keys` and return all of its claims."""
+        split = token.split(cls.DELIMITER, 1)
+        public_key = keys.get(split[1]) if len(split) == 2 else None
+        if public_key is None:
             return None
         try:
-            meta = jwt.decode(split[0], self.pool.get(split[1]), algorithms=[TokenVault.ALGORITHM])
-            if meta.pop(CONSTANTS.VALID, None) is None:
-                return None
-            return meta
+            return jwt.decode(split[0], public_key, algorithms=[cls.ALGORITHM])
         except jwt.exceptions.PyJWTError:
             return None
+
+    @staticmethod
+    def _revocation_id(claim: str) -> Union[bytes, str]:
+        """Revoked claims are kept as 16 raw UUID bytes, less than half the memory of the string."""
+        try:
+            return uuid.UUID(claim).bytes
+        except (ValueError, TypeError, AttributeError):
+            return claim
+
+    def _revoked_claims(self) -> Iterator[str]:
+        for claim in self.revoked:
+            yield str(uuid.UUID(bytes=claim)) if isinstance(claim, bytes) else claim
+
+
+from tokenvault.persister import VaultPersister  # noqa: E402,F401
+from tokenvault.stack import VaultStack  # noqa: E402,F401
+from tokenvault.writer import VaultWriter  # noqa: E402,F401
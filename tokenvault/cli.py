@@ -1,11 +1,17 @@
+import csv
+import contextlib
+import hashlib
 import json
 import os
+import sys
+import tempfile
 import pyperclip
 import typer
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional, Tuple
 from importlib.metadata import version, PackageNotFoundError
 import tokenvault
 from tokenvault.config import CONSTANTS
+from tokenvault.pool import pem_to_der
 
 app = typer.Typer()
 
@@ -93,9 +99,10 @@ def add(
     try:
         if metadata:
             metadata = json.loads(metadata)
-        vault = tokenvault.TokenVault(path, password=password)
-        token = vault.add(key, metadata=metadata)
-        vault.save(path, password=password)
+        with tokenvault.TokenVault.lock(path):
+            vault = tokenvault.TokenVault(path, password=password)
+            token = vault.add(key, metadata=metadata)
+            vault.save(path, password=password)
         pyperclip.copy(token)
         if echo_token:
             typer.echo(f"token: {token}")
@@ -115,12 +122,20 @@ def remove(
         "--password",
         help="If not provided and TOKENVAULT_PASSWORD is not set in environment, assume no password.",
     ),
+    tombstone: bool = typer.Option(
+        False,
+        "--tombstone",
+        help="Also hide the key in the vaults below this one when it is used as an overlay.",
+    ),
 ):
     """Remove a key from the vault"""
     try:
-        vault = tokenvault.TokenVault(path, password=password)
-        if vault.remove(key):
-            vault.save(path, password=password)
+        with tokenvault.TokenVault.lock(path):
+            vault = tokenvault.TokenVault(path, password=password)
+            removed = vault.tombstone(key) if tombstone else vault.remove(key)
+            if removed:
+                vault.save(path, password=password)
+        if removed:
             typer.echo(f"Removed key '{key}' from vault")
         else:
             typer.echo(f"Key '{key}' not found in vault")
@@ -128,6 +143,32 @@ def remove(
         typer.echo(PASSWORD_ERROR_MSG)
 
 
+@app.command()
+def revoke(
+    token: str = typer.Argument(..., help="Token to revoke"),
+    path: str = typer.Argument("vault.db", help="Path to the vault file"),
+    password: Optional[str] = typer.Option(
+        None,
+        "-p",
+        "--password",
+        help="If not provided and TOKENVAULT_PASSWORD is not set in environment, assume no password.",
+    ),
+):
+    """Revoke a single token while keeping the key and its other tokens valid"""
+    try:
+        with tokenvault.TokenVault.lock(path):
+            vault = tokenvault.TokenVault(path, password=password)
+            revoked = vault.revoke(token)
+            if revoked:
+                vault.save(path, password=password)
+        if revoked:
+            typer.echo("Token revoked")
+        else:
+            typer.echo("Token is not valid")
+    except ValueError:
+        typer.echo(PASSWORD_ERROR_MSG)
+
+
 @app.command()
 def validate(
     token: str = typer.Argument(..., help="Token to validate"),
@@ -183,3 +224,167 @@ def encrypted(path: str = typer.Argument("vault.db", help="Path to the vault fil
                 os.environ[CONSTANTS.TOKENVAULT_PASSWORD] = saved_password
     except ValueError:
         typer.echo("Vault is encrypted")
+
+
+def _file_format(path: str, file_format: Optional[str]) -> str:
+    file_format = (file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")).lower()
+    if file_format not in ("jsonl", "csv"):
+        raise typer.BadParameter("format must be 'jsonl' or 'csv'")
+    return file_format
+
+
+def _read_users(source: str, file_format: str) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Stream (key, metadata) pairs from a JSONL file of {"key", "metadata"} objects or a CSV file with a key column.
+    Keys must be strings, and a key listed twice is rejected: the second token would silently invalidate the first.
+    """
+    seen = set()
+    read = _read_csv_users if file_format == "csv" else _read_jsonl_users
+    for number, key, metadata in read(source):
+        if not isinstance(key, str):
+            raise typer.BadParameter(f"key must be a string in {source} line {number}")
+        if key in seen:
+            raise typer.BadParameter(f"duplicate key {key!r} in {source} line {number}")
+        seen.add(key)
+        yield key, metadata
+
+
+def _read_csv_users(source: str) -> Iterator[Tuple[int, Any, Optional[Dict[str, Any]]]]:
+    with open(source, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            key = row.pop("key", None)
+            if not key:
+                raise typer.BadParameter(f"missing key in {source} line {reader.line_num}")
+            yield reader.line_num, key, {name: value for name, value in row.items() if value}
+
+
+def _read_jsonl_users(source: str) -> Iterator[Tuple[int, Any, Optional[Dict[str, Any]]]]:
+    with open(source) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                user = json.loads(line)
+            except json.JSONDecodeError:
+                raise typer.BadParameter(f"{source} line {number} is not valid json")
+            if not isinstance(user, dict) or not user.get("key"):
+                raise typer.BadParameter(f"missing key in {source} line {number}")
+            if not isinstance(user.get("metadata") or {}, dict):
+                raise typer.BadParameter(f"metadata must be a json dict in {source} line {number}")
+            yield number, user["key"], user.get("metadata")
+
+
+@contextlib.contextmanager
+def _open_output(output: str, private: bool = False, staged: bool = False):
+    """
+    Open `output` for writing ('-' is stdout). With `staged`, writes go to a temp file next to it
+    which only replaces `output` once the block exits cleanly, and is removed otherwise.
+    """
+    if output == "-":
+        yield sys.stdout
+        return
+    if not staged:
+        fd = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 if private else 0o666)
+        with open(fd, "w", newline="") as f:
+            yield f
+        return
+    directory, name = os.path.split(os.path.abspath(output))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with open(fd, "w", newline="") as f:
+            yield f
+        if not private:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, output)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+@app.command("import")
+def import_(
+    source: str = typer.Argument(..., help="JSONL ({\"key\": ..., \"metadata\": {...}} per line) or CSV (key column) file"),
+    path: str = typer.Argument("vault.db", help="Path to the vault file"),
+    password: Optional[str] = typer.Option(
+        None,
+        "-p",
+        "--password",
+        help="If not provided and TOKENVAULT_PASSWORD is not set in environment, assume no password.",
+    ),
+    output: str = typer.Option(
+        "tokens.jsonl", "-o", "--output", help="Where to write the issued tokens as JSONL ('-' for stdout)"
+    ),
+    file_format: Optional[str] = typer.Option(
+        None, "-f", "--format", help="'jsonl' or 'csv'. Default: by file extension"
+    ),
+    workers: Optional[int] = typer.Option(
+        None, "-w", "--workers", help="Key-generation threads. Default: CPU count"
+    ),
+    overwrite: bool = typer.Option(
+        False, "--overwrite", help="Replace keys already in the vault (their existing tokens stop working)"
+    ),
+):
+    """Add many keys from a file in one go and write their tokens to an output file"""
+    try:
+        file_format = _file_format(source, file_format)
+        count = 0
+        with tokenvault.TokenVault.lock(path):
+            vault = tokenvault.TokenVault(path, password=password)
+
+            def new_users() -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+                for key, metadata in _read_users(source, file_format):
+                    if not overwrite and key in vault.pool:
+                        raise typer.BadParameter(f"{key!r} is already in {path}, pass --overwrite to replace it")
+                    yield key, metadata
+
+            # The tokens file only replaces `output` once the vault holding their keys is saved
+            with _open_output(output, private=True, staged=True) as out:
+                for key, token in vault.add_many(new_users(), workers=workers):
+                    out.write(json.dumps({"key": key, "token": token}) + "\n")
+                    count += 1
+                vault.save(path, password=password)
+        typer.echo(f"Imported {count} keys into {path}, tokens written to {output}", err=output == "-")
+    except ValueError:
+        typer.echo(PASSWORD_ERROR_MSG)
+
+
+@app.command()
+def export(
+    path: str = typer.Argument("vault.db", help="Path to the vault file"),
+    password: Optional[str] = typer.Option(
+        None,
+        "-p",
+        "--password",
+        help="If not provided and TOKENVAULT_PASSWORD is not set in environment, assume no password.",
+    ),
+    output: str = typer.Option("-", "-o", "--output", help="Output file ('-' for stdout)"),
+    file_format: Optional[str] = typer.Option(
+        None, "-f", "--format", help="'jsonl' or 'csv'. Default: by output extension"
+    ),
+):
+    """Export keys with their public keys and fingerprints as JSONL or CSV"""
+    try:
+        file_format = _file_format(output, file_format)
+        vault = tokenvault.TokenVault(path, password=password, compact=True)
+        with _open_output(output) as out:
+            fields = ["key", "fingerprint", "public_key"]
+            writer = csv.DictWriter(out, fieldnames=fields) if file_format == "csv" else None
+            if writer is not None:
+                writer.writeheader()
+            for key, public_key in vault.pool.items():
+                der = pem_to_der(public_key)
+                row = {
+                    "key": key,
+                    "fingerprint": hashlib.sha256(der if der is not None else public_key).hexdigest(),
+                    "public_key": public_key.decode("ascii"),
+                }
+                if writer is not None:
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(row) + "\n")
+    except ValueError:
+        typer.echo(PASSWORD_ERROR_MSG)
@@ -3,4 +3,10 @@ class CONSTANTS:
     TOKENVAULT_PASSWORD = 'TOKENVAULT_PASSWORD'
     RSA_PUBLIC_EXPONENT = 65537
     RSA_KEY_SIZE = 2048
-
+    TOKENVAULT_KEYRING = 'TOKENVAULT_KEYRING'
+    KEYRING_SERVICE = 'tokenvault'
+    KDF_SALT_SIZE = 16
+    SCRYPT_N = 2 ** 15
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    CHUNK_SIZE = 2 ** 20
@@ -0,0 +1,278 @@
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import cryptography.exceptions
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from tokenvault.config import CONSTANTS
+
+KDF_MAGIC = b"TVKDF1\n"
+KDF_SCRYPT = "scrypt"
+MAX_SCRYPT_N = 2 ** 20
+
+Password = Union[str, bytes]
+
+# Keys taken from the keyring once their passphrase verifier matched, by (passphrase, salt, n, r, p)
+_unlocked: Dict[Tuple[bytes, bytes, int, int, int], bytes] = {}
+
+
+def _to_bytes(password: Password) -> bytes:
+    return password.encode("utf-8") if isinstance(password, str) else bytes(password)
+
+
+def is_fernet_key(password: Password) -> bool:
+    """Whether `password` is already a 32-byte urlsafe base64 key that Fernet accepts as-is."""
+    try:
+        return len(base64.urlsafe_b64decode(_to_bytes(password))) == 32
+    except (binascii.Error, ValueError):
+        return False
+
+
+def new_kdf_params() -> Dict[str, Any]:
+    """Fresh KDF parameters (with a random salt) to store in a vault header."""
+    return {
+        "kdf": KDF_SCRYPT,
+        "salt": base64.b64encode(os.urandom(CONSTANTS.KDF_SALT_SIZE)).decode("ascii"),
+        "n": CONSTANTS.SCRYPT_N,
+        "r": CONSTANTS.SCRYPT_R,
+        "p": CONSTANTS.SCRYPT_P,
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def _scrypt(passphrase: bytes, salt: bytes, n: int, r: int, p: int) -> bytes:
+    key = Scrypt(salt=salt, length=32, n=n, r=r, p=p).derive(passphrase)
+    return base64.urlsafe_b64encode(key)
+
+
+def _keyring():
+    """The `keyring` module if the agent keyring is enabled and installed, otherwise None."""
+    if not os.getenv(CONSTANTS.TOKENVAULT_KEYRING):
+        return None
+    try:
+        import keyring
+    except ImportError:
+        return None
+    return keyring
+
+
+def derive_key(password: Password, params: Dict[str, Any],
+               check: Optional[Callable[[bytes], bool]] = None) -> bytes:
+    """
+    Derive a Fernet key from a passphrase and the KDF parameters of a vault header.
+    Results are cached in-process, and in the OS keyring when `TOKENVAULT_KEYRING` is set,
+    so repeated loads and saves of the same vault only pay for the KDF once.
+    The keyring entry is named by the (public) salt and parameters only. Its secret value holds
+    the key next to a verifier of the passphrase, and a cached key is only used when the
+    verifier matches the given passphrase (and `check`, if given, confirms it decrypts the vault).
+    """
+    args = _scrypt_args(password, params)
+    if args in _unlocked:
+        return _unlocked[args]
+    keyring = _keyring()
+    if keyring is None:
+        return _scrypt(*args)
+
+    passphrase, salt, n, r, p = args
+    entry = f"{params['salt']}:{n}:{r}:{p}"
+    verifier = hashlib.sha256(salt + passphrase).hexdigest()
+    cached = _keyring_key(keyring, entry, verifier)
+    if cached is not None and (check is None or check(cached)):
+        if len(_unlocked) >= 32:
+            _unlocked.clear()
+        _unlocked[args] = cached
+        return cached
+    key = _scrypt(*args)
+    if check is not None and not check(key):
+        # Wrong passphrase: keep whatever the keyring holds for the right one
+        return key
+    try:
+        keyring.set_password(CONSTANTS.KEYRING_SERVICE, entry, f"{key.decode('ascii')}:{verifier}")
+    except Exception:
+        pass
+    return key
+
+
+def _scrypt_args(password: Password, params: Dict[str, Any]) -> Tuple[bytes, bytes, int, int, int]:
+    """Validate the KDF parameters of a vault header and return the `_scrypt` arguments."""
+    if params.get("kdf") != KDF_SCRYPT:
+        raise ValueError(f"Unsupported key derivation function: {params.get('kdf')}")
+    n, r, p = int(params["n"]), int(params["r"]), int(params["p"])
+    if not 1 < n <= MAX_SCRYPT_N or n & (n - 1) or r < 1 or p < 1:
+        raise ValueError("Invalid key derivation parameters")
+    return _to_bytes(password), base64.b64decode(params["salt"]), n, r, p
+
+
+def _keyring_key(keyring, entry: str, verifier: str) -> Optional[bytes]:
+    """The key cached in keyring `entry` if its passphrase verifier matches `verifier`."""
+    try:
+        cached = keyring.get_password(CONSTANTS.KEYRING_SERVICE, entry)
+    except Exception:
+        return None
+    key, _, cached_verifier = (cached or "").partition(":")
+    if not key or not hmac.compare_digest(cached_verifier, verifier):
+        return None
+    return key.encode("ascii")
+
+
+def pack_kdf(params: Dict[str, Any], token: bytes) -> bytes:
+    """Prefix an encrypted payload with the KDF header needed to derive its key."""
+    return KDF_MAGIC + json.dumps(params, sort_keys=True).encode("utf-8") + b"\n" + token
+
+
+def unpack_kdf(data: bytes) -> Tuple[Optional[Dict[str, Any]], bytes]:
+    """Split a vault file into (KDF parameters, payload); parameters are None for headerless files."""
+    if not data.startswith(KDF_MAGIC):
+        return None, data
+    header, _, token = data[len(KDF_MAGIC):].partition(b"\n")
+    try:
+        return json.loads(header), token
+    except json.JSONDecodeError:
+        raise ValueError("Vault header is corrupted")
+
+
+# Chunked container: a binary header followed by independently authenticated AES-GCM chunks.
+#
+#   magic "TVC1" | chunk size (>I) | HKDF salt (16) | nonce prefix (7) | KDF header length (>H) | KDF header json
+#
+# Every chunk holds `chunk size` bytes of plaintext (the last one strictly less, possibly zero) plus a 16 byte tag.
+# Nonces are prefix | chunk index (>I) | last-chunk flag and the whole header is authenticated with every chunk,
+# so chunks cannot be reordered, dropped, truncated or moved between files (the STREAM construction).
+CHUNKED_MAGIC = b"TVC1"
+_CHUNKED_HEADER = struct.Struct(">4sI16s7sH")
+_TAG_SIZE = 16
+_HKDF_INFO = b"tokenvault chunked v1"
+
+
+def _chunk_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + struct.pack(">IB", index, last)
+
+
+def _chunk_key(base: bytes, salt: bytes) -> AESGCM:
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=_HKDF_INFO).derive(
+        base64.urlsafe_b64decode(base))
+    return AESGCM(key)
+
+
+def _container_key(password: Password, kdf_params: Optional[Dict[str, Any]], salt: bytes,
+                   check: Optional[Callable[[AESGCM], bool]] = None) -> AESGCM:
+    if kdf_params is None:
+        return _chunk_key(_to_bytes(password), salt)
+    opens = (lambda base: check(_chunk_key(base, salt))) if check is not None else None
+    return _chunk_key(derive_key(password, kdf_params, check=opens), salt)
+
+
+def encrypt_chunked(
+    plaintext: Iterable[bytes],
+    password: Password,
+    kdf_params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = CONSTANTS.CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Encrypt a stream of plaintext pieces into the chunked container, yielding the file piece by piece.
+    `password` must be a Fernet key unless `kdf_params` are given, in which case it is a passphrase.
+    """
+    salt, prefix = os.urandom(16), os.urandom(7)
+    kdf = json.dumps(kdf_params, sort_keys=True).encode("utf-8") if kdf_params is not None else b""
+    header = _CHUNKED_HEADER.pack(CHUNKED_MAGIC, chunk_size, salt, prefix, len(kdf)) + kdf
+    aead = _container_key(password, kdf_params, salt)
+    yield header
+    buffer, index = bytearray(), 0
+    for piece in plaintext:
+        buffer += piece
+        # Hold back a full chunk until more data follows: the last chunk must be short
+        while len(buffer) > chunk_size:
+            yield aead.encrypt(_chunk_nonce(prefix, index, False), bytes(buffer[:chunk_size]), header)
+            del buffer[:chunk_size]
+            index += 1
+    if len(buffer) == chunk_size:
+        yield aead.encrypt(_chunk_nonce(prefix, index, False), bytes(buffer), header)
+        buffer.clear()
+        index += 1
+    yield aead.encrypt(_chunk_nonce(prefix, index, True), bytes(buffer), header)
+
+
+def read_chunked_header(f: BinaryIO) -> Tuple[bytes, Tuple[int, bytes, bytes], Optional[Dict[str, Any]]]:
+    """Read the container header from `f`: returns (raw header, (chunk size, salt, nonce prefix), KDF params)."""
+    fixed = f.read(_CHUNKED_HEADER.size)
+    if len(fixed) != _CHUNKED_HEADER.size:
+        raise ValueError("Vault file is truncated")
+    magic, chunk_size, salt, prefix, kdf_len = _CHUNKED_HEADER.unpack(fixed)
+    if magic != CHUNKED_MAGIC:
+        raise ValueError("Not a chunked vault file")
+    kdf = f.read(kdf_len)
+    if len(kdf) != kdf_len:
+        raise ValueError("Vault file is truncated")
+    try:
+        kdf_params = json.loads(kdf) if kdf_len else None
+    except json.JSONDecodeError:
+        raise ValueError("Vault header is corrupted")
+    return fixed + kdf, (chunk_size, salt, prefix), kdf_params
+
+
+def decrypt_chunked(f: BinaryIO, password: Password, workers: int = 1) -> Tuple[Optional[Dict[str, Any]], Iterator[bytes]]:
+    """
+    Open a chunked container from `f`: returns its KDF parameters and an iterator that stream-decrypts
+    the plaintext chunks in order. With `workers > 1`, up to `2 * workers` chunks are decrypted
+    concurrently in a thread pool. Iterating raises `cryptography.exceptions.InvalidTag` for a wrong
+    password or tampered data, and `ValueError` if the file is truncated.
+    """
+    header, (chunk_size, salt, prefix), kdf_params = read_chunked_header(f)
+
+    def opens(candidate: AESGCM) -> bool:
+        start = f.tell()
+        data = f.read(chunk_size + _TAG_SIZE)
+        f.seek(start)
+        try:
+            candidate.decrypt(_chunk_nonce(prefix, 0, len(data) < chunk_size + _TAG_SIZE), data, header)
+        except (cryptography.exceptions.InvalidTag, ValueError):
+            return False
+        return True
+
+    aead = _container_key(password, kdf_params, salt, check=opens)
+
+    def decrypt(item: Tuple[int, bytes, bool]) -> bytes:
+        index, data, last = item
+        return aead.decrypt(_chunk_nonce(prefix, index, last), data, header)
+
+    return kdf_params, _ordered_map(decrypt, _ciphertexts(f, chunk_size), workers)
+
+
+def _ciphertexts(f: BinaryIO, chunk_size: int) -> Iterator[Tuple[int, bytes, bool]]:
+    """Read the encrypted chunks following the header as (index, ciphertext, is last)."""
+    index = 0
+    while True:
+        data = f.read(chunk_size + _TAG_SIZE)
+        last = len(data) < chunk_size + _TAG_SIZE
+        if last and not data:
+            raise ValueError("Vault file is truncated")
+        yield index, data, last
+        if last:
+            return
+        index += 1
+
+
+def _ordered_map(func: Callable[[Any], bytes], items: Iterator[Any], workers: int) -> Iterator[bytes]:
+    """`map(func, items)`, running up to `2 * workers` calls ahead on a thread pool when `workers > 1`."""
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Future] = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import logging
+from typing import Any, Dict, Optional
+
+import tokenvault
+
+logger = logging.getLogger(__name__)
+
+
+class VaultPersister:
+    """
+    Debounced background saves for a vault edited inside an async server.
+
+    Changes are applied to the in-memory vault immediately; the first change after a save
+    starts a timer and every change made before it fires is written by one `asave`, off the
+    event loop. A change is therefore on disk at most `delay` seconds (plus one save) later.
+    Call `flush` (or `close` on shutdown) to write pending changes right away.
+    A failed background save is logged and retried after another `delay`; `flush` and
+    `close` raise the failure instead. Each save snapshots the vault on the event loop
+    (see `TokenVault.asave`), so for vaults with millions of keys pick a `delay` that keeps
+    that pause rare.
+
+        persister = VaultPersister(vault, "vault.db")
+        token = await persister.add("user@example.com", {"role": "admin"})
+        ...
+        await persister.close()
+    """
+
+    def __init__(self, vault: "tokenvault.TokenVault", path: str, password: Optional[str] = None,
+                 delay: float = 1.0):
+        self.vault = vault
+        self.path = path
+        self.password = password
+        self.delay = delay
+        self.saves = 0
+        self._dirty = False
+        self._timer: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._sleeping = False
+        self._closed = False
+
+    async def add(self, key: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Add `key` with its RSA key generated off the event loop, and schedule a save."""
+        loop = asyncio.get_running_loop()
+        public_key_bytes, token = await loop.run_in_executor(None, self.vault._issue, key, metadata)
+        self.vault._put(key, public_key_bytes)
+        self.touch()
+        return token
+
+    def remove(self, key: str) -> bool:
+        """Remove `key` and schedule a save if it existed."""
+        removed = self.vault.remove(key)
+        if removed:
+            self.touch()
+        return removed
+
+    def revoke(self, token: str) -> bool:
+        """Revoke `token` and schedule a save if it was valid."""
+        revoked = self.vault.revoke(token)
+        if revoked:
+            self.touch()
+        return revoked
+
+    def touch(self):
+        """Mark the vault as changed (for edits made directly on `vault`) and schedule a save."""
+        if self._closed:
+            raise RuntimeError("VaultPersister is closed")
+        self._dirty = True
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._save_later())
+
+    async def flush(self):
+        """Save pending changes now."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                await self.vault.asave(self.path, password=self.password)
+            except BaseException:
+                self._dirty = True
+                raise
+            self.saves += 1
+
+    async def close(self):
+        """Stop scheduling saves and write whatever is still pending."""
+        self._closed = True
+        timer = self._timer
+        if timer is not None and not timer.done():
+            # Only interrupt the timer while it sleeps: a save already running in the executor must finish
+            if self._sleeping:
+                timer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await timer
+        await self.flush()
+
+    async def _save_later(self):
+        while self._dirty and not self._closed:
+            self._sleeping = True
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self._sleeping = False
+            try:
+                await self.flush()
+            except Exception:
+                # Nobody awaits this task: report the failure and keep the changes queued for the next attempt
+                logger.exception("Saving vault %s failed, retrying in %ss", self.path, self.delay)
@@ -0,0 +1,215 @@
+import base64
+import binascii
+from array import array
+from collections.abc import MutableMapping
+from typing import Iterator, Optional
+
+PEM_HEADER = b"-----BEGIN PUBLIC KEY-----\n"
+PEM_FOOTER = b"-----END PUBLIC KEY-----\n"
+PEM_LINE_LENGTH = 64
+
+_RAW = 0
+_DER = 1
+_EMPTY = -1
+_DELETED = -2
+
+
+def pem_to_der(pem: bytes) -> Optional[bytes]:
+    """
+    Return the DER body of a PEM encoded public key, or None for anything else, including
+    PEM that `der_to_pem` would not reproduce byte for byte (e.g. other line wrapping).
+    """
+    if not (pem.startswith(PEM_HEADER) and pem.endswith(PEM_FOOTER)):
+        return None
+    body = pem[len(PEM_HEADER):-len(PEM_FOOTER)]
+    try:
+        der = binascii.a2b_base64(body)
+    except binascii.Error:
+        return None
+    # Same check as `der_to_pem(der) == pem`, without building the lines in Python
+    encoded = binascii.b2a_base64(der, newline=False)
+    full, lines = len(encoded) // PEM_LINE_LENGTH, -(-len(encoded) // PEM_LINE_LENGTH)
+    if (len(body) != len(encoded) + lines or not body.endswith(b"\n")
+            or body[PEM_LINE_LENGTH::PEM_LINE_LENGTH + 1][:full] != b"\n" * full
+            or body.replace(b"\n", b"") != encoded):
+        return None
+    return der
+
+
+def der_to_pem(der: bytes) -> bytes:
+    """Wrap a DER public key exactly as `cryptography` serializes it to PEM."""
+    body = base64.b64encode(der)
+    lines = [body[i:i + PEM_LINE_LENGTH] for i in range(0, len(body), PEM_LINE_LENGTH)]
+    return PEM_HEADER + b"\n".join(lines) + b"\n" + PEM_FOOTER
+
+
+class CompactPool(MutableMapping):
+    """
+    A memory-compact drop-in for the default `key -> PEM bytes` pool.
+
+    Keys (utf-8) and values are appended to two contiguous `bytearray` buffers and
+    addressed through `array` offset tables, with an open-addressing hash table of
+    entry indices (and each entry's cached hash) for O(1) lookups. Public keys are kept as raw DER (less than half
+    the size of the base64 PEM) and only re-encoded to PEM when an entry is read,
+    so no per-entry Python objects exist until they are accessed.
+    Removed and overwritten entries leave garbage in the buffers which is reclaimed
+    once it outweighs the live data (counted both in entries and in value bytes).
+    """
+
+    def __init__(self, items=None):
+        self._clear()
+        if items is not None:
+            self.update(items)
+
+    def _clear(self, capacity: int = 8):
+        self._keys = bytearray()
+        self._values = bytearray()
+        self._key_offsets = array("Q", [0])
+        self._hashes = array("q")
+        self._value_starts = array("Q")
+        self._value_ends = array("Q")
+        self._kinds = bytearray()
+        self._live = bytearray()
+        self._slots = array("q", [_EMPTY]) * capacity
+        self._size = 0
+        self._used_slots = 0
+        self._dead_bytes = 0
+
+    def _key_at(self, index: int) -> memoryview:
+        return memoryview(self._keys)[self._key_offsets[index]:self._key_offsets[index + 1]]
+
+    def _probe(self, encoded: bytes, key_hash: int):
+        """Return (slot, entry index) for `encoded`; entry index is -1 when missing."""
+        slots, hashes = self._slots, self._hashes
+        mask = len(slots) - 1
+        slot = key_hash & mask
+        free = -1
+        while True:
+            index = slots[slot]
+            if index == _EMPTY:
+                return (free if free >= 0 else slot), -1
+            if index == _DELETED:
+                if free < 0:
+                    free = slot
+            elif hashes[index] == key_hash and self._key_at(index) == encoded:
+                return slot, index
+            slot = (slot + 1) & mask
+
+    def _resize(self, capacity: int):
+        slots = array("q", [_EMPTY]) * capacity
+        mask = capacity - 1
+        for index in range(len(self._live)):
+            if not self._live[index]:
+                continue
+            slot = self._hashes[index] & mask
+            while slots[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = index
+        self._slots = slots
+        self._used_slots = self._size
+
+    def _compact(self):
+        entries = [(bytes(self._key_at(i)), self._hashes[i], self._kinds[i], self._raw_value(i))
+                   for i in range(len(self._live)) if self._live[i]]
+        capacity = len(self._slots)
+        self._clear(capacity)
+        for key, key_hash, kind, value in entries:
+            self._append(key, key_hash, kind, value)
+        self._resize(capacity)
+
+    def _raw_value(self, index: int) -> bytes:
+        return bytes(self._values[self._value_starts[index]:self._value_ends[index]])
+
+    def _append(self, encoded: bytes, key_hash: int, kind: int, value: bytes) -> int:
+        keys, values = self._keys, self._values
+        keys += encoded
+        self._key_offsets.append(len(keys))
+        self._hashes.append(key_hash)
+        self._value_starts.append(len(values))
+        values += value
+        self._value_ends.append(len(values))
+        self._kinds.append(kind)
+        self._live.append(1)
+        self._size += 1
+        return len(self._live) - 1
+
+    def __setitem__(self, key: str, value: bytes):
+        encoded = key.encode("utf-8")
+        key_hash = hash(encoded)
+        der = pem_to_der(value)
+        kind, stored = (_RAW, bytes(value)) if der is None else (_DER, der)
+        slot, index = self._probe(encoded, key_hash)
+        if index >= 0:
+            self._dead_bytes += self._value_ends[index] - self._value_starts[index]
+            self._value_starts[index] = len(self._values)
+            self._values += stored
+            self._value_ends[index] = len(self._values)
+            self._kinds[index] = kind
+            self._maybe_compact()
+            return
+        reuses_tombstone = self._slots[slot] == _DELETED
+        self._slots[slot] = self._append(encoded, key_hash, kind, stored)
+        if not reuses_tombstone:
+            self._used_slots += 1
+        if self._used_slots * 3 >= len(self._slots) * 2:
+            self._resize(len(self._slots) * 2)
+
+    def __getitem__(self, key: str) -> bytes:
+        encoded = key.encode("utf-8")
+        _, index = self._probe(encoded, hash(encoded))
+        if index < 0:
+            raise KeyError(key)
+        value = self._raw_value(index)
+        return der_to_pem(value) if self._kinds[index] == _DER else value
+
+    def __delitem__(self, key: str):
+        encoded = key.encode("utf-8")
+        slot, index = self._probe(encoded, hash(encoded))
+        if index < 0:
+            raise KeyError(key)
+        self._slots[slot] = _DELETED
+        self._live[index] = 0
+        self._dead_bytes += self._value_ends[index] - self._value_starts[index]
+        self._size -= 1
+        self._maybe_compact()
+
+    def __contains__(self, key) -> bool:
+        if not isinstance(key, str):
+            return False
+        encoded = key.encode("utf-8")
+        return self._probe(encoded, hash(encoded))[1] >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self._live)):
+            if self._live[index]:
+                yield bytes(self._key_at(index)).decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def copy(self) -> "CompactPool":
+        """A snapshot of the pool: copies the buffers wholesale without decoding any entry."""
+        other = type(self).__new__(type(self))
+        other._keys, other._values = bytearray(self._keys), bytearray(self._values)
+        other._key_offsets, other._slots = self._key_offsets[:], self._slots[:]
+        other._hashes = self._hashes[:]
+        other._value_starts, other._value_ends = self._value_starts[:], self._value_ends[:]
+        other._kinds, other._live = bytearray(self._kinds), bytearray(self._live)
+        other._size, other._used_slots = self._size, self._used_slots
+        other._dead_bytes = self._dead_bytes
+        return other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(<{self._size} keys>)"
+
+    def _maybe_compact(self):
+        dead = len(self._live) - self._size
+        live_bytes = len(self._values) - self._dead_bytes
+        if (dead > 1024 and dead > self._size) or (self._dead_bytes > 1 << 16 and self._dead_bytes > live_bytes):
+            self._compact()
+
+    def nbytes(self) -> int:
+        """Approximate number of bytes held by the buffers and index tables."""
+        tables = (self._key_offsets, self._hashes, self._value_starts, self._value_ends, self._slots)
+        return (len(self._keys) + len(self._values) + len(self._kinds) + len(self._live)
+                + sum(t.itemsize * len(t) for t in tables))
@@ -0,0 +1,152 @@
+import os
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import tokenvault
+from tokenvault.config import CONSTANTS
+
+
+class VaultStack:
+    """
+    Validate tokens against several vaults layered on top of each other, e.g. a base vault
+    kept in git and per-environment overlays. Later layers take precedence: a key is served by
+    the topmost layer that has it, and a tombstone (`TokenVault.tombstone`) in a layer hides
+    the key in every layer below it. A token revoked in any layer is rejected.
+
+    The layers are merged into a single `key -> serving layer` index, so `validate` does exactly
+    one index lookup however many layers there are, then reads the public key from that layer
+    (no copy of the public keys is kept, so `CompactPool` layers stay compact). Reloading a layer
+    only re-resolves the keys that layer had or has.
+
+        stack = VaultStack.from_paths(["base.db", "production.db"])
+        stack.validate(token)
+        stack.refresh()  # reload the layers whose files changed
+    """
+
+    def __init__(self, layers: Sequence["tokenvault.TokenVault"]):
+        self.layers: List["tokenvault.TokenVault"] = list(layers)
+        self.paths: List[Optional[str]] = [None] * len(self.layers)
+        self._passwords: List[Optional[str]] = [None] * len(self.layers)
+        self._stats: List[Optional[Tuple[int, int, int]]] = [None] * len(self.layers)
+        self._owners: Dict[str, int] = {}
+        self._index = _MergedKeys(self.layers, self._owners)
+        for key in {key for layer in self.layers for key in self._layer_keys(layer)}:
+            self._resolve(key)
+        self._merge_revoked()
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str], password: Union[None, str, Sequence[Optional[str]]] = None,
+                   compact: bool = False) -> "VaultStack":
+        """
+        Stack the vault files in `paths`, base first.
+        :param password: one password for all layers, or one per layer
+        """
+        paths = list(paths)
+        passwords = list(password) if isinstance(password, (list, tuple)) else [password] * len(paths)
+        if len(passwords) != len(paths):
+            raise ValueError("password must be a single password or one per path")
+        stack = cls([tokenvault.TokenVault(path, password=pw, compact=compact) for path, pw in zip(paths, passwords)])
+        stack.paths, stack._passwords = paths, passwords
+        stack._stats = [cls._file_stat(path) for path in paths]
+        return stack
+
+    def validate(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Validate a token against the merged layers and return its metadata.
+        :param token: The token to validate
+        :return: None if the token is invalid or revoked, otherwise a dict with the metadata
+        """
+        return tokenvault.TokenVault._validate(token, self._index, self._revoked)
+
+    def revoke(self, token: str, layer: int = -1) -> bool:
+        """
+        Revoke a token served by any layer, recording the revocation in `layer` (the topmost by default).
+        :return: True if the token was valid and is now revoked, False otherwise
+        """
+        meta = tokenvault.TokenVault._decode(token, self._index)
+        claim = meta.get(CONSTANTS.VALID) if meta is not None else None
+        if claim is None:
+            return False
+        revocation_id = tokenvault.TokenVault._revocation_id(claim)
+        if revocation_id in self._revoked:
+            return False
+        self.layers[layer].revoked.add(revocation_id)
+        self._revoked.add(revocation_id)
+        return True
+
+    def replace(self, index: int, vault: "tokenvault.TokenVault"):
+        """Swap the layer at `index` for `vault` and update the merged index incrementally."""
+        affected = self._layer_keys(self.layers[index]) | self._layer_keys(vault)
+        self.layers[index] = vault
+        for key in affected:
+            self._resolve(key)
+        self._merge_revoked()
+
+    def reload(self, index: int):
+        """Reload the layer at `index` from its file."""
+        path = self.paths[index]
+        if path is None:
+            raise ValueError(f"Layer {index} was not loaded from a file")
+        stat = self._file_stat(path)
+        self.replace(index, tokenvault.TokenVault(
+            path, password=self._passwords[index], compact=isinstance(self.layers[index].pool, tokenvault.CompactPool)))
+        self._stats[index] = stat
+
+    def refresh(self) -> List[int]:
+        """Reload every layer whose file changed since it was loaded. Returns the reloaded indices."""
+        changed = [i for i, path in enumerate(self.paths)
+                   if path is not None and self._file_stat(path) != self._stats[i]]
+        for index in changed:
+            self.reload(index)
+        return changed
+
+    def __contains__(self, key) -> bool:
+        return key in self._owners
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._owners)
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    @staticmethod
+    def _layer_keys(layer: "tokenvault.TokenVault") -> Set[str]:
+        return set(layer.pool) | layer.tombstones
+
+    @staticmethod
+    def _file_stat(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _resolve(self, key: str):
+        for index in range(len(self.layers) - 1, -1, -1):
+            layer = self.layers[index]
+            if key in layer.pool:
+                self._owners[key] = index
+                return
+            if key in layer.tombstones:
+                break
+        self._owners.pop(key, None)
+
+    def _merge_revoked(self):
+        self._revoked = set().union(*(layer.revoked for layer in self.layers))
+
+
+class _MergedKeys(Mapping):
+    """The `key -> public key` mapping of a stack, read through the layer that serves each key."""
+
+    def __init__(self, layers: List["tokenvault.TokenVault"], owners: Dict[str, int]):
+        self._layers = layers
+        self._owners = owners
+
+    def __getitem__(self, key: str) -> bytes:
+        return self._layers[self._owners[key]].pool[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._owners)
+
+    def __len__(self) -> int:
+        return len(self._owners)
@@ -0,0 +1,76 @@
+import contextlib
+import os
+import pathlib
+import uuid
+from typing import Iterable, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+PathLike = Union[str, os.PathLike]
+
+
+def atomic_write(path: PathLike, data: Union[bytes, Iterable[bytes]]) -> None:
+    """
+    Replace `path` with `data` so readers see either the old or the new file, never a torn one:
+    write a temp file next to it, fsync, rename over the target and fsync the directory.
+    `data` may be an iterable of pieces, which are streamed to disk as they are produced.
+    """
+    target = pathlib.Path(path)
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for piece in ([data] if isinstance(data, bytes) else data):
+                f.write(piece)
+            f.flush()
+            os.fsync(f.fileno())
+        if target.exists():
+            os.chmod(tmp, target.stat().st_mode & 0o7777)
+        os.replace(tmp, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(target.parent)
+
+
+def _fsync_dir(directory: pathlib.Path) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def lock_path(path: PathLike) -> pathlib.Path:
+    """The sidecar file used to lock `path` (the vault itself is replaced on every save)."""
+    target = pathlib.Path(path)
+    return target.with_name(f"{target.name}.lock")
+
+
+@contextlib.contextmanager
+def file_lock(path: PathLike) -> Iterator[None]:
+    """Hold an exclusive advisory lock on `path` across processes and threads."""
+    with open(lock_path(path), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
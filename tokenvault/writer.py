@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import tokenvault
+
+_STOP = object()
+
+
+class VaultWriter:
+    """
+    Group-commit writer for a vault file shared by many threads (and processes).
+
+    `add` and `remove` block until their change is durably on disk, but concurrent calls are
+    batched: a background thread takes the file lock once, applies every queued change, and
+    pays for a single serialize, encrypt and fsync cycle. Key generation for `add` happens in
+    the calling thread, outside the commit. The vault is only re-read when another writer
+    changed the file since the last commit.
+
+        with VaultWriter("vault.db") as writer:
+            token = writer.add("user@example.com", {"role": "admin"})
+    """
+
+    def __init__(self, path: str, password: Optional[str] = None, max_batch: int = 1024):
+        self.path = path
+        self.password = password
+        self.max_batch = max_batch
+        self.commits = 0
+        self._vault: Optional["tokenvault.TokenVault"] = None
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tokenvault-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, key: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Add `key` to the vault file and return its token once the change is saved."""
+        public_key_bytes, token = tokenvault.TokenVault._issue(key, metadata)
+        self._submit("add", key, public_key_bytes).result()
+        return token
+
+    def remove(self, key: str) -> bool:
+        """Remove `key` from the vault file. Returns True if the key existed."""
+        return self._submit("remove", key, None).result()
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self) -> "VaultWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self, op: str, key: str, value: Optional[bytes]) -> Future:
+        if self._closed:
+            raise RuntimeError("VaultWriter is closed")
+        future: Future = Future()
+        self._queue.put((op, key, value, future))
+        return future
+
+    def _file_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch: List[tuple] = [first]
+            try:
+                with tokenvault.TokenVault.lock(self.path):
+                    # Drain only once the lock is held, so everything queued while we waited for it joins this batch
+                    stopping = self._drain(batch)
+                    results = self._commit(batch)
+            except Exception as e:
+                # Failing to lock, load or save fails this batch only; the writer keeps serving
+                self._vault = None
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            for (*_, future), result in zip(batch, results):
+                future.set_result(result)
+        # Anything that raced past `close()` will never be committed
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                item[-1].set_exception(RuntimeError("VaultWriter is closed"))
+
+    def _drain(self, batch: List[tuple]) -> bool:
+        """Move queued changes into `batch` up to `max_batch`. Returns True if `close()` was queued."""
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _commit(self, batch: List[tuple]) -> List[Optional[bool]]:
+        stat = self._file_stat()
+        if self._vault is None or stat != self._stat:
+            exists = stat is not None
+            self._vault = tokenvault.TokenVault(self.path, self.password) if exists else tokenvault.TokenVault()
+        results: List[Optional[bool]] = []
+        for op, key, value, _ in batch:
+            if op == "add":
+                self._vault._put(key, value)
+                results.append(None)
+            else:
+                results.append(self._vault.remove(key))
+        self._vault.save(self.path, password=self.password)
+        self._stat = self._file_stat()
+        self.commits += 1
+        return results